@@ -15,23 +15,258 @@ Options:
     --output, -o        Output directory (default: chunks/)
     --max-tokens        Maximum tokens per chunk (default: 50000)
     --min-tokens        Minimum tokens per chunk (default: 50)
+    --jsonl             Write all sections to one sections.jsonl file
 
 Example:
     python chunk_content.py page_data.json -o chunks/ --max-tokens 50000
 """
 
 import argparse
+import gzip
+import heapq
 import json
 import logging
+import math
 import os
 import re
+import string
 import sys
-from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, FrozenSet, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import tiktoken  # type: ignore[import-not-found]
+except ImportError:
+    tiktoken = None  # type: ignore[assignment]
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Patterns for the per-section image/link extractors
+IMG_PATTERN = re.compile(
+    r'<img[^>]*src=["\']([^"\']+)["\'](?:[^>]*alt=["\']([^"\']*)["\'])?',
+    re.IGNORECASE
+)
+LINK_PATTERN = re.compile(r'<a[^>]*href=["\']([^"\']+)["\'][^>]*>([^<]*)</a>', re.IGNORECASE)
+
+# Maximum images/links recorded per section
+MAX_EXTRACTED_ITEMS = 20
+
+# ASCII-only lowercasing; unlike str.lower() it keeps every offset in place
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def load_json(path: str) -> Any:
+    """Load a JSON file, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_page_data(path: str) -> Dict:
+    """Load page_data.json, reading a gzipped raw_html file back in as a string."""
+    page_data = load_json(path)
+    raw_html = page_data.get('raw_html')
+    if isinstance(raw_html, dict):
+        html_path = os.path.join(os.path.dirname(os.path.abspath(path)), raw_html['path'])
+        with gzip.open(html_path, 'rt', encoding='utf-8') as f:
+            page_data['raw_html'] = f.read()
+    return page_data
+
+
+def write_json(path: str, data: Any, indent: bool = False) -> None:
+    """Write data as UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2 if indent else None, ensure_ascii=False)
+
+
+def write_jsonl(path: str, items: List[Any]) -> None:
+    """Write items as UTF-8 JSON Lines, one compact object per line."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            for item in items:
+                f.write(orjson.dumps(item))
+                f.write(b'\n')
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False))
+            f.write('\n')
+
+
+@lru_cache(maxsize=8192)
+def _selector_for(node_id: Optional[str], tag: str, classes: Tuple[str, ...]) -> str:
+    """Build a CSS selector from hashable node parts (memoized)."""
+    if node_id:
+        return f"#{node_id}"
+
+    for cls in classes:
+        if cls and not cls[0].isdigit() and not cls.startswith('-'):
+            return f"{tag}.{cls}"
+
+    return tag
+
+
+class Rect:
+    """Bounding box of a section in page coordinates."""
+
+    __slots__ = ('x', 'y', 'width', 'height', 'top', 'bottom', 'left', 'right', 'area')
+
+    def __init__(self, x: float, y: float, width: float, height: float,
+                 top: float, bottom: float, left: float, right: float) -> None:
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.top = top
+        self.bottom = bottom
+        self.left = left
+        self.right = right
+        self.area = width * height
+
+    @classmethod
+    def from_dict(cls, rect: Dict) -> 'Rect':
+        return cls(
+            rect.get('x', 0), rect.get('y', 0), rect.get('width', 0), rect.get('height', 0),
+            rect.get('top', 0), rect.get('bottom', 0), rect.get('left', 0), rect.get('right', 0),
+        )
+
+    def set_top(self, top: float) -> None:
+        """Move the top edge, keeping height and area in sync."""
+        self.top = top
+        self.y = top
+        self.height = self.bottom - top
+        self.area = self.width * self.height
+
+    def set_bottom(self, bottom: float) -> None:
+        """Move the bottom edge, keeping height and area in sync."""
+        self.bottom = bottom
+        self.height = bottom - self.top
+        self.area = self.width * self.height
+
+    def to_dict(self) -> Dict:
+        return {
+            'x': self.x,
+            'y': self.y,
+            'width': self.width,
+            'height': self.height,
+            'top': self.top,
+            'bottom': self.bottom,
+            'left': self.left,
+            'right': self.right,
+        }
+
+
+class Section:
+    """
+    A candidate section while it moves through the chunking pipeline.
+    Converted to a plain dict only when finalized for output.
+    """
+
+    __slots__ = ('tag', 'id', 'classes', 'selector', 'rect', 'styles',
+                 'inner_html_length', 'estimated_tokens', 'children_count', 'children')
+
+    def __init__(self, tag: str, id: Optional[str], classes: List[str], selector: str,
+                 rect: Rect, styles: Dict, inner_html_length: int, estimated_tokens: int,
+                 children_count: int, children: List[Dict]) -> None:
+        self.tag = tag
+        self.id = id
+        self.classes = classes
+        self.selector = selector
+        self.rect = rect
+        self.styles = styles
+        self.inner_html_length = inner_html_length
+        self.estimated_tokens = estimated_tokens
+        self.children_count = children_count
+        self.children = children
+
+
+def _overlapping_pairs(rects: List[Rect], min_area: float) -> List[Tuple[int, int, float]]:
+    """
+    Find every pair of rects whose intersection is larger than min_area.
+
+    Sweeps top-to-bottom, keeping only rects whose vertical span still
+    crosses the sweep line, so only vertically overlapping pairs are tested.
+
+    Returns:
+        Sorted list of (i, j, overlap_area) with i < j
+    """
+    pairs: List[Tuple[int, int, float]] = []
+    active: List[Tuple[float, int]] = []  # min-heap of (bottom, index)
+
+    for j in sorted(range(len(rects)), key=lambda k: rects[k].top):
+        r2 = rects[j]
+
+        while active and active[0][0] <= r2.top:
+            heapq.heappop(active)
+
+        for _, i in active:
+            r1 = rects[i]
+
+            # Reject separated pairs on the cheap comparisons first
+            if r1.right <= r2.left or r2.right <= r1.left:
+                continue
+            if r1.bottom <= r2.top or r2.bottom <= r1.top:
+                continue
+
+            overlap_area = ((min(r1.right, r2.right) - max(r1.left, r2.left)) *
+                            (min(r1.bottom, r2.bottom) - max(r1.top, r2.top)))
+            if overlap_area > min_area:
+                pairs.append((min(i, j), max(i, j), overlap_area))
+
+        heapq.heappush(active, (r2.bottom, j))
+
+    pairs.sort()
+    return pairs
+
+
+def _fill_gaps(rects: List[Rect], page_height: float, gap_threshold: float) -> None:
+    """
+    Stretch y-sorted rects in place so the page is covered top to bottom.
+
+    Gaps larger than gap_threshold are closed by extending the first rect
+    to the page top, the last to page_height, and splitting each middle
+    gap at its midpoint.
+    """
+    if not rects:
+        return
+
+    # Handle top gap
+    first = rects[0]
+    if first.top > gap_threshold:
+        first.set_top(0)
+
+    # Handle middle gaps
+    prev = first
+    for i in range(1, len(rects)):
+        current = rects[i]
+
+        gap = current.top - prev.bottom
+        if gap > gap_threshold:
+            midpoint = prev.bottom + gap / 2
+            prev.set_bottom(midpoint)
+            current.set_top(midpoint)
+
+        prev = current
+
+    # Handle bottom gap
+    last = rects[-1]
+    if page_height - last.bottom > gap_threshold:
+        last.set_bottom(page_height)
+
 
 class ContentChunker:
     """
@@ -47,17 +282,28 @@ class ContentChunker:
     MIN_SECTION_WIDTH_RATIO = 0.2  # 20% of page width
 
     # Tags to skip
-    SKIP_TAGS = {'script', 'style', 'head', 'meta', 'link', 'noscript', 'svg', 'path', 'br', 'hr'}
+    SKIP_TAGS: ClassVar[FrozenSet[str]] = frozenset({'script', 'style', 'head', 'meta', 'link', 'noscript', 'svg', 'path', 'br', 'hr'})
 
     # Horizontal overlap threshold for detecting side-by-side elements
     HORIZONTAL_OVERLAP_THRESHOLD = 0.3
 
+    # Vertical gaps (pixels) larger than this are closed when merging gaps
+    GAP_THRESHOLD = 30
+
+    # Token estimation: default ratio, and the HTML window size sampled
+    # when calibrating it with tiktoken
+    DEFAULT_TOKENS_PER_CHAR = 0.25  # 1 token ≈ 4 characters
+    TOKEN_SAMPLE_CHARS = 4096
+
     def __init__(self, max_tokens: int = 50000, min_tokens: int = 50):
         self.max_tokens = max_tokens
         self.min_tokens = min_tokens
         self.page_width = 0
         self.page_height = 0
         self.raw_html = ""
+        self._raw_html_lower = ""
+        self.tokens_per_char = self.DEFAULT_TOKENS_PER_CHAR
+        self._html_cache: Dict[Tuple[str, Optional[str], Optional[str]], str] = {}
 
     def chunk(self, page_data: Dict) -> Tuple[List[Dict], Dict]:
         """
@@ -73,7 +319,10 @@ class ContentChunker:
         metadata = page_data.get('metadata', {})
         self.page_width = metadata.get('page_width', 1920)
         self.page_height = metadata.get('page_height', 1080)
-        self.raw_html = page_data.get('raw_html', '')
+        self.raw_html = page_data.get('raw_html') or ''
+        self._raw_html_lower = self.raw_html.translate(ASCII_LOWER)
+        self._html_cache = {}
+        self.tokens_per_char = self._calibrate_tokens_per_char()
 
         dom_tree = page_data.get('dom_tree')
         if not dom_tree:
@@ -82,6 +331,8 @@ class ContentChunker:
 
         logger.info(f"Page dimensions: {self.page_width}x{self.page_height}")
 
+        self._normalize_tags(dom_tree)
+
         # Step 1: Extract raw sections from DOM tree
         sections = self._extract_sections_recursive(dom_tree)
         logger.info(f"Step 1: Extracted {len(sections)} raw sections")
@@ -90,38 +341,79 @@ class ContentChunker:
         sections = self._split_large_sections(sections)
         logger.info(f"Step 2: After splitting: {len(sections)} sections")
 
-        # Step 3: Handle horizontal layouts
-        sections = self._handle_horizontal_layout(sections)
-        logger.info(f"Step 3: After horizontal handling: {len(sections)} sections")
+        # Step 3: Order rows, remove overlaps and merge gaps (Principles 1 and 2)
+        sections = self._sweep_and_normalize(sections)
+        logger.info(f"Step 3: After removing overlaps and merging gaps: {len(sections)} sections")
 
-        # Step 4: Remove overlaps (Principle 1)
-        sections = self._remove_overlaps(sections)
-        logger.info(f"Step 4: After removing overlaps: {len(sections)} sections")
-
-        # Step 5: Merge gaps (Principle 2)
-        sections = self._merge_gaps(sections)
-        logger.info(f"Step 5: After merging gaps: {len(sections)} sections")
-
-        # Step 6: Validate Three Principles
+        # Step 4: Validate Three Principles
         validation = self._validate_three_principles(sections)
-        logger.info(f"Step 6: Validation complete - principles_met: {validation['principles_met']}")
+        logger.info(f"Step 4: Validation complete - principles_met: {validation['principles_met']}")
+
+        # Step 5: Finalize sections with HTML content
+        finalized = self._finalize_sections(sections)
+        logger.info(f"Step 5: Finalized {len(finalized)} sections")
 
-        # Step 7: Finalize sections with HTML content
-        sections = self._finalize_sections(sections)
-        logger.info(f"Step 7: Finalized {len(sections)} sections")
+        return finalized, validation
 
-        return sections, validation
+    def _calibrate_tokens_per_char(self) -> float:
+        """
+        Measure the page's tokens-per-character ratio with tiktoken.
 
-    def _extract_sections_recursive(self, dom_tree: Dict) -> List[Dict]:
+        Tokenizes sqrt(N) evenly spaced windows of the raw HTML (N = number
+        of TOKEN_SAMPLE_CHARS windows), so the cost grows with the square
+        root of the page size. Falls back to DEFAULT_TOKENS_PER_CHAR when
+        tiktoken or raw HTML is unavailable.
+        """
+        if tiktoken is None or not self.raw_html:
+            return self.DEFAULT_TOKENS_PER_CHAR
+
+        try:
+            encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable, using default token ratio: {e}")
+            return self.DEFAULT_TOKENS_PER_CHAR
+
+        window = self.TOKEN_SAMPLE_CHARS
+        num_windows = max(1, len(self.raw_html) // window)
+        sample_count = math.isqrt(num_windows)
+
+        sampled_chars = 0
+        sampled_tokens = 0
+        for i in range(sample_count):
+            start = (i * num_windows // sample_count) * window
+            text = self.raw_html[start:start + window]
+            sampled_chars += len(text)
+            sampled_tokens += len(encoding.encode(text, disallowed_special=()))
+
+        if not sampled_chars:
+            return self.DEFAULT_TOKENS_PER_CHAR
+
+        ratio = sampled_tokens / sampled_chars
+        logger.info(f"Calibrated {ratio:.3f} tokens/char from {sample_count} HTML samples")
+        return ratio
+
+    def _estimate_tokens(self, length: int) -> int:
+        """Estimate the token count of length characters of HTML."""
+        return int(length * self.tokens_per_char)
+
+    def _normalize_tags(self, dom_tree: Dict) -> None:
+        """Lowercase every tag once so later passes can compare tags directly."""
+        stack = [dom_tree]
+        while stack:
+            node = stack.pop()
+            node['tag'] = node.get('tag', 'div').lower()
+            stack.extend(node.get('children', []))
+
+    def _extract_sections_recursive(self, dom_tree: Dict) -> List[Section]:
         """Extract sections from DOM tree."""
         sections = []
         min_width = self.page_width * self.MIN_SECTION_WIDTH_RATIO
 
         def estimate_tokens(node: Dict) -> int:
-            return node.get('inner_html_length', 0) // 4
+            return self._estimate_tokens(node.get('inner_html_length', 0))
 
         def is_valid_section(node: Dict) -> bool:
-            tag = node.get('tag', '').lower()
+            tag = node['tag']
             if tag in self.SKIP_TAGS:
                 return False
 
@@ -135,118 +427,118 @@ class ContentChunker:
 
             return True
 
-        def create_section(node: Dict) -> Dict:
-            rect = node.get('rect', {})
-            styles = node.get('styles', {})
-
-            return {
-                'tag': node.get('tag', 'div'),
-                'id': node.get('id'),
-                'classes': node.get('classes', []),
-                'selector': self._generate_selector(node),
-                'type': 'section',
-                'rect': {
-                    'x': rect.get('x', 0),
-                    'y': rect.get('y', 0),
-                    'width': rect.get('width', 0),
-                    'height': rect.get('height', 0),
-                    'top': rect.get('top', 0),
-                    'bottom': rect.get('bottom', 0),
-                    'left': rect.get('left', 0),
-                    'right': rect.get('right', 0),
-                },
-                'styles': {
-                    'background_color': styles.get('background_color'),
-                    'background_image': styles.get('background_image'),
-                    'color': styles.get('color'),
-                    'padding': styles.get('padding'),
-                },
-                'inner_html_length': node.get('inner_html_length', 0),
-                'estimated_tokens': estimate_tokens(node),
-                'children_count': node.get('children_count', 0),
-                'children': node.get('children', []),
-            }
-
-        def extract_from_node(node: Dict, depth: int = 0) -> List[Dict]:
+        def extract_from_nodes(nodes: List[Dict]) -> List[Section]:
+            # Depth-first walk with an explicit stack; children are pushed in
+            # reverse so sections come out in document order.
             result = []
-            tag = node.get('tag', '').lower()
+            stack = list(reversed(nodes))
 
-            if tag in self.SKIP_TAGS:
-                return result
+            while stack:
+                node = stack.pop()
+                tag = node['tag']
 
-            if not is_valid_section(node):
-                for child in node.get('children', []):
-                    result.extend(extract_from_node(child, depth + 1))
-                return result
+                if tag in self.SKIP_TAGS:
+                    continue
 
-            tokens = estimate_tokens(node)
-            if tokens < self.min_tokens:
-                return result
+                if not is_valid_section(node):
+                    stack.extend(reversed(node.get('children', [])))
+                    continue
+
+                tokens = estimate_tokens(node)
+                if tokens < self.min_tokens:
+                    continue
+
+                result.append(self._create_section(node, tokens))
 
-            result.append(create_section(node))
             return result
 
-        def find_main_content(node: Dict) -> List[Dict]:
-            tag = node.get('tag', '').lower()
+        def find_main_content(root: Dict) -> List[Dict]:
+            # A full-page div is replaced by its descendants' content, or kept
+            # itself if that comes out empty. The (node, len(result)) marker
+            # pushed below its children checks this once they are done.
+            result: List[Dict] = []
+            stack: List[Union[Dict, Tuple[Dict, int]]] = [root]
+
+            while stack:
+                item = stack.pop()
+                if isinstance(item, tuple):
+                    node, start = item
+                    if len(result) == start:
+                        result.append(node)
+                    continue
 
-            if tag in ['html', 'body']:
-                result = []
-                for child in node.get('children', []):
-                    result.extend(find_main_content(child))
-                return result
+                node = item
+                tag = node['tag']
 
-            if tag == 'div':
-                rect = node.get('rect', {})
-                if (rect.get('width', 0) >= self.page_width * 0.9 and
-                    rect.get('height', 0) >= self.page_height * 0.9):
-                    result = []
-                    for child in node.get('children', []):
-                        result.extend(find_main_content(child))
-                    if result:
-                        return result
+                if tag in ['html', 'body']:
+                    stack.extend(reversed(node.get('children', [])))
+                    continue
 
-            return [node]
+                if tag == 'div':
+                    rect = node.get('rect', {})
+                    if (rect.get('width', 0) >= self.page_width * 0.9 and
+                        rect.get('height', 0) >= self.page_height * 0.9):
+                        stack.append((node, len(result)))
+                        stack.extend(reversed(node.get('children', [])))
+                        continue
 
-        main_nodes = find_main_content(dom_tree)
-        for node in main_nodes:
-            sections.extend(extract_from_node(node))
+                result.append(node)
 
-        return sections
+            return result
 
-    def _generate_selector(self, node: Dict) -> str:
-        """Generate CSS selector for node."""
-        if node.get('id'):
-            return f"#{node['id']}"
+        sections.extend(extract_from_nodes(find_main_content(dom_tree)))
 
-        selector = node.get('tag', 'div').lower()
-        classes = node.get('classes', [])
+        return sections
 
-        if classes:
-            for cls in classes:
-                if cls and not cls[0].isdigit() and not cls.startswith('-'):
-                    selector += f".{cls}"
-                    break
+    def _create_section(self, node: Dict, tokens: int) -> Section:
+        """
+        Build a pipeline Section from a DOM node.
 
-        return selector
+        styles and children are shared with the node, not copied; nothing
+        downstream writes to them. The rect is copied into a Rect because
+        gap filling moves its edges.
+        """
+        return Section(
+            tag=node['tag'],
+            id=node.get('id'),
+            classes=node.get('classes', []),
+            selector=self._generate_selector(node),
+            rect=Rect.from_dict(node.get('rect', {})),
+            styles=node.get('styles', {}),
+            inner_html_length=node.get('inner_html_length', 0),
+            estimated_tokens=tokens,
+            children_count=node.get('children_count', 0),
+            children=node.get('children', []),
+        )
+
+    def _generate_selector(self, node: Dict) -> str:
+        """Generate CSS selector for node."""
+        return _selector_for(node.get('id'), node['tag'], tuple(node.get('classes', ())))
 
-    def _split_large_sections(self, sections: List[Dict]) -> List[Dict]:
+    def _split_large_sections(self, sections: List[Section]) -> List[Section]:
         """Split sections that exceed max tokens (Principle 3)."""
         result = []
+        # Worklist in reverse order: oversized sections are replaced in place
+        # by their child sections, so output keeps document order.
+        stack = list(reversed(sections))
 
-        def split_section(section: Dict) -> List[Dict]:
-            tokens = section.get('estimated_tokens', 0)
+        while stack:
+            section = stack.pop()
+            tokens = section.estimated_tokens
 
             if tokens <= self.max_tokens:
-                return [section]
+                result.append(section)
+                continue
 
-            children = section.get('children', [])
+            children = section.children
             if not children:
                 logger.warning(f"Cannot split section with {tokens} tokens (no children)")
-                return [section]
+                result.append(section)
+                continue
 
             child_sections = []
             for child in children:
-                tag = child.get('tag', '').lower()
+                tag = child['tag']
                 if tag in self.SKIP_TAGS:
                     continue
 
@@ -254,184 +546,118 @@ class ContentChunker:
                 if rect.get('height', 0) < self.MIN_SECTION_HEIGHT:
                     continue
 
-                child_tokens = child.get('inner_html_length', 0) // 4
+                child_tokens = self._estimate_tokens(child.get('inner_html_length', 0))
                 if child_tokens < self.min_tokens:
                     continue
 
-                child_section = {
-                    'tag': child.get('tag', 'div'),
-                    'id': child.get('id'),
-                    'classes': child.get('classes', []),
-                    'selector': self._generate_selector(child),
-                    'type': 'section',
-                    'rect': {
-                        'x': rect.get('x', 0),
-                        'y': rect.get('y', 0),
-                        'width': rect.get('width', 0),
-                        'height': rect.get('height', 0),
-                        'top': rect.get('top', 0),
-                        'bottom': rect.get('bottom', 0),
-                        'left': rect.get('left', 0),
-                        'right': rect.get('right', 0),
-                    },
-                    'styles': child.get('styles', {}),
-                    'inner_html_length': child.get('inner_html_length', 0),
-                    'estimated_tokens': child_tokens,
-                    'children_count': child.get('children_count', 0),
-                    'children': child.get('children', []),
-                }
-
-                child_sections.extend(split_section(child_section))
-
-            return child_sections if child_sections else [section]
-
-        for section in sections:
-            result.extend(split_section(section))
+                child_sections.append(self._create_section(child, child_tokens))
+
+            if child_sections:
+                stack.extend(reversed(child_sections))
+            else:
+                result.append(section)
 
         return result
 
-    def _handle_horizontal_layout(self, sections: List[Dict]) -> List[Dict]:
-        """Handle side-by-side elements (e.g., card grids)."""
-        if len(sections) <= 1:
-            return sections
+    def _sweep_and_normalize(self, sections: List[Section]) -> List[Section]:
+        """
+        Order, de-overlap and gap-fill sections in one sweep down the page.
 
-        sections.sort(key=lambda s: (s['rect']['y'], s['rect']['x']))
+        Sections are sorted once by (y, x) and grouped into rows of
+        side-by-side elements (e.g., card grids), each ordered left-to-right.
+        As each row closes, its sections are checked against those kept so
+        far, keeping the one with more content when two overlap (Principle 1).
+        The kept sections are then stretched to close gaps (Principle 2).
+        """
+        if not sections:
+            return sections
 
-        groups = []
-        current_group = [sections[0]]
+        sections.sort(key=lambda s: (s.rect.y, s.rect.x))
+
+        kept: List[Section] = []
+        # (left, top, right, bottom, area, tokens) of kept sections, aligned
+        # with `kept`, so the inner loop works on locals only.
+        kept_cache: List[Tuple[float, float, float, float, float, int]] = []
+
+        def keep_row(row: List[Section]) -> None:
+            row.sort(key=lambda s: s.rect.x)
+
+            for section in row:
+                s_rect = section.rect
+                s_left, s_top, s_right, s_bottom = s_rect.left, s_rect.top, s_rect.right, s_rect.bottom
+                s_area = s_rect.area
+                s_tokens = section.estimated_tokens
+
+                is_redundant = False
+                replace_idx = None
+
+                for idx, (k_left, k_top, k_right, k_bottom, k_area, k_tokens) in enumerate(kept_cache):
+                    overlap_width = min(s_right, k_right) - max(s_left, k_left)
+                    if overlap_width <= 0:
+                        continue
+                    overlap_height = min(s_bottom, k_bottom) - max(s_top, k_top)
+                    if overlap_height <= 0:
+                        continue
+                    overlap_area = overlap_width * overlap_height
+
+                    min_area = min(s_area, k_area)
+                    if min_area > 0 and overlap_area / min_area > 0.5:
+                        if s_tokens > k_tokens:
+                            replace_idx = idx
+                            break
+                        else:
+                            is_redundant = True
+                            break
+
+                cached = (s_left, s_top, s_right, s_bottom, s_area, s_tokens)
+                if replace_idx is not None:
+                    # Move to the end of the check order, as a new keep would
+                    del kept[replace_idx]
+                    del kept_cache[replace_idx]
+                    kept.append(section)
+                    kept_cache.append(cached)
+                elif not is_redundant:
+                    kept.append(section)
+                    kept_cache.append(cached)
+
+        row = [sections[0]]
 
         for i in range(1, len(sections)):
-            current = sections[i]
-            prev = current_group[-1]
+            current_rect = sections[i].rect
+            prev_rect = row[-1].rect
 
-            overlap_top = max(current['rect']['top'], prev['rect']['top'])
-            overlap_bottom = min(current['rect']['bottom'], prev['rect']['bottom'])
+            overlap_top = max(current_rect.top, prev_rect.top)
+            overlap_bottom = min(current_rect.bottom, prev_rect.bottom)
             overlap_height = max(0, overlap_bottom - overlap_top)
 
-            current_height = current['rect']['bottom'] - current['rect']['top']
-            prev_height = prev['rect']['bottom'] - prev['rect']['top']
-            min_height = min(current_height, prev_height)
+            min_height = min(current_rect.height, prev_rect.height)
 
             if min_height > 0 and overlap_height / min_height > self.HORIZONTAL_OVERLAP_THRESHOLD:
-                current_group.append(current)
+                row.append(sections[i])
             else:
-                groups.append(current_group)
-                current_group = [current]
-
-        groups.append(current_group)
-
-        result = []
-        for group in groups:
-            group.sort(key=lambda s: s['rect']['x'])
-            result.extend(group)
-
-        return result
-
-    def _remove_overlaps(self, sections: List[Dict]) -> List[Dict]:
-        """Remove overlapping sections, keeping the one with more content (Principle 1)."""
-        if len(sections) <= 1:
-            return sections
-
-        kept = []
-
-        for section in sections:
-            s_rect = section['rect']
-            s_area = s_rect['width'] * s_rect['height']
-
-            is_redundant = False
-            remove_existing = None
-
-            for k in kept:
-                k_rect = k['rect']
-
-                overlap_left = max(s_rect['left'], k_rect['left'])
-                overlap_right = min(s_rect['right'], k_rect['right'])
-                overlap_top = max(s_rect['top'], k_rect['top'])
-                overlap_bottom = min(s_rect['bottom'], k_rect['bottom'])
-
-                overlap_width = max(0, overlap_right - overlap_left)
-                overlap_height = max(0, overlap_bottom - overlap_top)
-                overlap_area = overlap_width * overlap_height
+                keep_row(row)
+                row = [sections[i]]
 
-                min_area = min(s_area, k_rect['width'] * k_rect['height'])
-                if min_area > 0 and overlap_area / min_area > 0.5:
-                    if section['estimated_tokens'] > k['estimated_tokens']:
-                        remove_existing = k
-                        break
-                    else:
-                        is_redundant = True
-                        break
+        keep_row(row)
 
-            if remove_existing:
-                kept.remove(remove_existing)
-                kept.append(section)
-            elif not is_redundant:
-                kept.append(section)
+        # Rows reorder sections by x, so restore vertical order before filling gaps
+        kept.sort(key=lambda s: s.rect.y)
+        _fill_gaps([s.rect for s in kept], self.page_height, self.GAP_THRESHOLD)
 
         return kept
 
-    def _merge_gaps(self, sections: List[Dict]) -> List[Dict]:
-        """Extend sections to fill gaps (Principle 2)."""
-        if not sections:
-            return sections
-
-        sections.sort(key=lambda s: s['rect']['y'])
-
-        gap_threshold = 30
-
-        # Handle top gap
-        first = sections[0]
-        if first['rect']['top'] > gap_threshold:
-            first['rect']['top'] = 0
-            first['rect']['y'] = 0
-            first['rect']['height'] = first['rect']['bottom']
-
-        # Handle middle gaps
-        for i in range(1, len(sections)):
-            prev = sections[i - 1]
-            current = sections[i]
-
-            gap = current['rect']['top'] - prev['rect']['bottom']
-            if gap > gap_threshold:
-                midpoint = prev['rect']['bottom'] + gap / 2
-                prev['rect']['bottom'] = midpoint
-                prev['rect']['height'] = prev['rect']['bottom'] - prev['rect']['top']
-                current['rect']['top'] = midpoint
-                current['rect']['y'] = midpoint
-                current['rect']['height'] = current['rect']['bottom'] - current['rect']['top']
-
-        # Handle bottom gap
-        last = sections[-1]
-        if self.page_height - last['rect']['bottom'] > gap_threshold:
-            last['rect']['bottom'] = self.page_height
-            last['rect']['height'] = last['rect']['bottom'] - last['rect']['top']
-
-        return sections
-
-    def _validate_three_principles(self, sections: List[Dict]) -> Dict:
+    def _validate_three_principles(self, sections: List[Section]) -> Dict:
         """Validate the Three Principles."""
         errors = []
         warnings = []
 
         # Principle 1: Check overlaps
-        for i, s1 in enumerate(sections):
-            for j, s2 in enumerate(sections):
-                if i >= j:
-                    continue
-
-                overlap_left = max(s1['rect']['left'], s2['rect']['left'])
-                overlap_right = min(s1['rect']['right'], s2['rect']['right'])
-                overlap_top = max(s1['rect']['top'], s2['rect']['top'])
-                overlap_bottom = min(s1['rect']['bottom'], s2['rect']['bottom'])
-
-                if overlap_left < overlap_right and overlap_top < overlap_bottom:
-                    overlap_area = (overlap_right - overlap_left) * (overlap_bottom - overlap_top)
-                    if overlap_area > 100:
-                        warnings.append(f"Overlap: section {i+1} and {j+1} ({overlap_area:.0f}px²)")
+        for i, j, overlap_area in _overlapping_pairs([s.rect for s in sections], 100):
+            warnings.append(f"Overlap: section {i+1} and {j+1} ({overlap_area:.0f}px²)")
 
         # Principle 2: Check coverage
         if sections:
-            total_coverage = sum(s['rect']['width'] * s['rect']['height'] for s in sections)
+            total_coverage = sum(s.rect.area for s in sections)
             page_area = self.page_width * self.page_height
             coverage_ratio = total_coverage / page_area if page_area > 0 else 0
 
@@ -440,12 +666,12 @@ class ContentChunker:
 
         # Principle 3: Check token limits
         for i, s in enumerate(sections):
-            tokens = s.get('estimated_tokens', 0)
+            tokens = s.estimated_tokens
             if tokens > self.max_tokens:
                 errors.append(f"Section {i+1} exceeds {self.max_tokens} tokens: {tokens}")
 
         # Stats
-        token_counts = [s.get('estimated_tokens', 0) for s in sections]
+        token_counts = [s.estimated_tokens for s in sections]
         stats = {
             'total_sections': len(sections),
             'total_tokens': sum(token_counts),
@@ -461,115 +687,140 @@ class ContentChunker:
             'stats': stats
         }
 
-    def _finalize_sections(self, sections: List[Dict]) -> List[Dict]:
+    def _finalize_sections(self, sections: List[Section]) -> List[Dict]:
         """Finalize sections with HTML content and sequential naming."""
-        sections.sort(key=lambda s: (s['rect']['y'], s['rect']['x']))
-
-        finalized = []
-        for idx, section in enumerate(sections):
-            # Extract HTML from raw_html if available
-            html = self._extract_html_for_section(section)
-
-            finalized.append({
-                'id': f'section-{idx + 1}',
-                'name': f'section_{idx + 1}',
-                'type': 'section',
-                'selector': section['selector'],
-                'rect': section['rect'],
-                'styles': section.get('styles', {}),
-                'html': html,
-                'estimated_tokens': len(html) // 4 if html else section.get('estimated_tokens', 0),
-                'images': self._extract_images_from_html(html),
-                'links': self._extract_links_from_html(html),
-            })
+        sections.sort(key=lambda s: (s.rect.y, s.rect.x))
+
+        return [self._finalize_one(idx, section) for idx, section in enumerate(sections)]
 
-        return finalized
+    def _finalize_one(self, idx: int, section: Section) -> Dict:
+        """Build the output record for the section at position idx."""
+        # Extract HTML from raw_html if available
+        html = self._extract_html_for_section(section)
 
-    def _extract_html_for_section(self, section: Dict) -> str:
+        return {
+            'id': f'section-{idx + 1}',
+            'name': f'section_{idx + 1}',
+            'type': 'section',
+            'selector': section.selector,
+            'rect': section.rect.to_dict(),
+            'styles': section.styles,
+            'html': html,
+            'estimated_tokens': self._estimate_tokens(len(html)) if html else section.estimated_tokens,
+            'images': self._extract_images_from_html(html),
+            'links': self._extract_links_from_html(html),
+        }
+
+    def _extract_html_for_section(self, section: Section) -> str:
         """Extract HTML content for a section from raw HTML."""
         if not self.raw_html:
             return ""
 
-        selector = section.get('selector', '')
-        tag = section.get('tag', 'div')
-        element_id = section.get('id')
-        classes = section.get('classes', [])
+        # The lookup depends only on tag, id and first class, so sections
+        # sharing them (e.g., repeated card templates) reuse one search.
+        first_class = section.classes[0] if section.classes else None
+        key = (section.tag, section.id, first_class)
+
+        html = self._html_cache.get(key)
+        if html is None:
+            html = self._locate_html(section.tag, section.id, first_class)
+            self._html_cache[key] = html
+
+        return html
 
+    def _locate_html(self, tag: str, element_id: Optional[str], first_class: Optional[str]) -> str:
+        """Find the HTML of the element with this tag and id or first class."""
         # Strategy 1: Search by ID
         if element_id:
-            pattern = f'<{tag}[^>]*id=["\']?{re.escape(element_id)}["\']?[^>]*>'
-            match = re.search(pattern, self.raw_html, re.IGNORECASE)
-            if match:
-                start = match.start()
-                end = self._find_closing_tag(self.raw_html, start, tag)
+            start = self._find_tag_with_id(tag, element_id)
+            if start != -1:
+                end = self._find_closing_tag(start, tag)
                 if end > start:
                     return self.raw_html[start:end]
 
         # Strategy 2: Search by class
-        if classes and classes[0]:
-            first_class = classes[0]
+        if first_class:
             if not first_class[0].isdigit():
                 pattern = f'<{tag}[^>]*class=["\'][^"\']*{re.escape(first_class)}[^"\']*["\'][^>]*>'
                 match = re.search(pattern, self.raw_html, re.IGNORECASE)
                 if match:
                     start = match.start()
-                    end = self._find_closing_tag(self.raw_html, start, tag)
+                    end = self._find_closing_tag(start, tag)
                     if end > start:
                         return self.raw_html[start:end]
 
         return ""
 
-    def _find_closing_tag(self, html: str, start: int, tag: str) -> int:
+    def _find_tag_with_id(self, tag: str, element_id: str) -> int:
+        """Find the start of the <tag ... id="element_id"> opening tag, or -1."""
+        # raw_html comes from the browser's serializer, which always writes
+        # attributes as name="value", so a literal search is enough.
+        html = self._raw_html_lower
+        needle = f' id="{element_id.translate(ASCII_LOWER)}"'
+        open_tag = f'<{tag}'
+
+        pos = html.find(needle)
+        while pos != -1:
+            tag_start = html.rfind(open_tag, 0, pos)
+            # The attribute must sit inside that same opening tag
+            if (tag_start != -1 and html[tag_start + len(open_tag)].isspace() and
+                    html.find('>', tag_start, pos) == -1):
+                return tag_start
+            pos = html.find(needle, pos + 1)
+
+        return -1
+
+    def _find_closing_tag(self, start: int, tag: str) -> int:
         """Find the matching closing tag position."""
+        # Scan the lowercased copy made once in chunk(); each open/close
+        # position is only searched again after the scan has passed it.
+        html = self._raw_html_lower
         open_tag = f'<{tag}'
         close_tag = f'</{tag}>'
 
         depth = 0
-        pos = start
-
-        while pos < len(html):
-            next_open = html.lower().find(open_tag.lower(), pos)
-            next_close = html.lower().find(close_tag.lower(), pos)
-
-            if next_close == -1:
-                return len(html)
+        next_open = html.find(open_tag, start)
+        next_close = html.find(close_tag, start)
 
+        while next_close != -1:
             if next_open != -1 and next_open < next_close:
                 depth += 1
-                pos = next_open + len(open_tag)
+                next_open = html.find(open_tag, next_open + len(open_tag))
             else:
                 if depth == 0:
                     return next_close + len(close_tag)
                 depth -= 1
-                pos = next_close + len(close_tag)
+                next_close = html.find(close_tag, next_close + len(close_tag))
 
         return len(html)
 
     def _extract_images_from_html(self, html: str) -> List[Dict]:
         """Extract images from HTML."""
         images = []
-        pattern = r'<img[^>]*src=["\']([^"\']+)["\'][^>]*(?:alt=["\']([^"\']*)["\'])?[^>]*>'
 
-        for match in re.finditer(pattern, html, re.IGNORECASE):
+        for match in IMG_PATTERN.finditer(html):
             images.append({
                 'src': match.group(1),
                 'alt': match.group(2) or ''
             })
+            if len(images) >= MAX_EXTRACTED_ITEMS:
+                break
 
-        return images[:20]  # Limit to 20
+        return images
 
     def _extract_links_from_html(self, html: str) -> List[Dict]:
         """Extract links from HTML."""
         links = []
-        pattern = r'<a[^>]*href=["\']([^"\']+)["\'][^>]*>([^<]*)</a>'
 
-        for match in re.finditer(pattern, html, re.IGNORECASE):
+        for match in LINK_PATTERN.finditer(html):
             links.append({
                 'href': match.group(1),
                 'text': match.group(2).strip()
             })
+            if len(links) >= MAX_EXTRACTED_ITEMS:
+                break
 
-        return links[:20]  # Limit to 20
+        return links
 
 
 def main():
@@ -578,14 +829,15 @@ def main():
     parser.add_argument('--output', '-o', default='chunks', help='Output directory')
     parser.add_argument('--max-tokens', type=int, default=50000, help='Maximum tokens per chunk')
     parser.add_argument('--min-tokens', type=int, default=50, help='Minimum tokens per chunk')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='Write all sections to a single sections.jsonl file')
 
     args = parser.parse_args()
 
     # Load page data
     logger.info(f"Loading page data from {args.input}")
     try:
-        with open(args.input, 'r', encoding='utf-8') as f:
-            page_data = json.load(f)
+        page_data = load_page_data(args.input)
     except Exception as e:
         logger.error(f"Failed to load page data: {e}")
         sys.exit(1)
@@ -601,17 +853,25 @@ def main():
     # Create output directory
     os.makedirs(args.output, exist_ok=True)
 
-    # Save each section
-    for section in sections:
-        output_file = os.path.join(args.output, f"{section['name']}.json")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(section, f, indent=2, ensure_ascii=False)
-        logger.info(f"Saved {section['name']} ({section['estimated_tokens']} tokens)")
+    if args.jsonl:
+        # One file, one section per line, in section order
+        output_file = os.path.join(args.output, 'sections.jsonl')
+        write_jsonl(output_file, sections)
+        logger.info(f"Saved {len(sections)} sections to {output_file}")
+    else:
+        # Save each section (compact: section HTML dominates the file size)
+        def save_section(section: Dict) -> None:
+            output_file = os.path.join(args.output, f"{section['name']}.json")
+            write_json(output_file, section)
+            logger.info(f"Saved {section['name']} ({section['estimated_tokens']} tokens)")
+
+        # File writes are I/O-bound, so overlap them on a thread pool
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(save_section, sections))
 
     # Save validation report
     validation_file = os.path.join(args.output, '_validation.json')
-    with open(validation_file, 'w', encoding='utf-8') as f:
-        json.dump(validation, f, indent=2)
+    write_json(validation_file, validation, indent=True)
 
     # Summary
     logger.info("=" * 50)
@@ -633,8 +893,8 @@ def main():
 
     if validation['errors']:
         logger.error(f"  Errors: {len(validation['errors'])}")
-        for e in validation['errors']:
-            logger.error(f"    - {e}")
+        for err in validation['errors']:
+            logger.error(f"    - {err}")
         sys.exit(1)
 
 
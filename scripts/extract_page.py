@@ -5,13 +5,28 @@ Extracts complete page data using Playwright for pixel-perfect cloning.
 
 Usage:
     python extract_page.py <URL> [options]
+    python extract_page.py --urls-file urls.txt [options]
 
 Options:
-    --output, -o        Output file path (default: page_data.json)
+    --output, -o        Output file path (default: page_data.json); the
+                        screenshot is saved beside it (page_data.jpg)
+    --urls-file         Extract every URL in a file (one per line); results go to
+                        page_data_1.json, page_data_2.json, ... next to --output
+    --concurrency       Pages extracted at once with --urls-file (default: 5)
     --viewport          Viewport size WxH (default: 1920x1080)
-    --wait              Wait time after load in ms (default: 3000)
+    --wait              Max wait for network idle after load in ms, 0 to skip
+                        (default: 3000)
+    --settle            Fixed extra wait after that, for content rendered after
+                        the network goes idle, in ms (default: 0)
     --full-screenshot   Capture full page screenshot
+    --screenshot-format Screenshot format, jpeg or png (default: jpeg)
+    --screenshot-quality JPEG screenshot quality (default: 85)
     --max-depth         Maximum DOM traversal depth (default: 20)
+    --xpath             Include an xpath on every DOM node
+    --include-hidden    Also put elements inside display:none subtrees in the
+                        DOM tree (their assets are always collected)
+    --block-assets      Skip downloading images, media, and fonts (faster; the
+                        screenshot and image sizes will not match the live page)
 
 Example:
     python extract_page.py "https://example.com" -o page_data.json --viewport 1920x1080
@@ -20,18 +35,86 @@ Example:
 import asyncio
 import argparse
 import base64
+import gzip
 import json
 import logging
+import os
+import re
 import sys
+from array import array
+from collections import Counter
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from urllib.parse import urljoin, urlparse
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+def write_json(path: str, data: Any) -> None:
+    """Write data as indented UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def camel_to_snake(name: str) -> str:
+    """Convert a camelCase CSS property name to snake_case."""
+    return re.sub(r'([a-z])([A-Z])', r'\1_\2', name).lower()
+
+
+class BrowserPool:
+    """
+    Keeps one launched Chromium and hands out a fresh context per task.
+    A browser passed in is shared and left open on close().
+    """
+
+    LAUNCH_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+
+    def __init__(self, browser=None):
+        self._browser = browser
+        self._owns_browser = browser is None
+        self._playwright = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def start(self):
+        """Launch the browser unless one is already running."""
+        if self._browser is not None:
+            return
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True, args=self.LAUNCH_ARGS)
+
+    async def close(self):
+        """Close the browser if this pool launched it."""
+        if self._owns_browser:
+            if self._browser:
+                await self._browser.close()
+            if self._playwright:
+                await self._playwright.stop()
+            self._browser = None
+            self._playwright = None
+
+    async def acquire(self, **context_options):
+        """Create a new browser context; the caller closes it when done."""
+        return await self._browser.new_context(**context_options)
+
+
 class PageExtractor:
     """
     Playwright-based page extractor.
@@ -52,52 +135,146 @@ class PageExtractor:
         'fontFamily', 'fontSize', 'fontWeight', 'lineHeight', 'textAlign',
         'transform'
     ]
+    # Output key for each style property, in the same order
+    STYLE_KEYS = list(map(camel_to_snake, STYLE_PROPS))
+
+    # Resource types skipped by block_assets; their URLs are still collected
+    BLOCKED_RESOURCE_TYPES = frozenset({'image', 'media', 'font'})
 
-    def __init__(self, viewport_width: int = 1920, viewport_height: int = 1080):
+    # Seconds each extraction subtask may run before it is given up on
+    SUBTASK_TIMEOUT = 30
+
+    def __init__(self, viewport_width: int = 1920, viewport_height: int = 1080,
+                 pool: Optional[BrowserPool] = None, screenshot_format: str = 'jpeg',
+                 screenshot_quality: int = 85):
         self.viewport_width = viewport_width
         self.viewport_height = viewport_height
-        self._browser = None
-        self._playwright = None
+        # PNG is for pixel-exact diffs
+        self.screenshot_format = screenshot_format
+        self.screenshot_quality = screenshot_quality
+        # An externally managed pool is shared and left running on exit
+        self._pool = pool
+        self._owns_pool = pool is None
 
     async def __aenter__(self):
-        from playwright.async_api import async_playwright
-        self._playwright = await async_playwright().start()
-        self._browser = await self._playwright.chromium.launch(
-            headless=True,
-            args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-        )
+        if self._pool is None:
+            self._pool = BrowserPool()
+        await self._pool.start()
         return self
 
     async def __aexit__(self, *args):
-        if self._browser:
-            await self._browser.close()
-        if self._playwright:
-            await self._playwright.stop()
+        if self._owns_pool and self._pool:
+            await self._pool.close()
 
     async def extract(self, url: str, wait_time: int = 3000, max_depth: int = 20,
-                      full_screenshot: bool = False) -> Dict[str, Any]:
+                      full_screenshot: bool = False, include_xpath: bool = False,
+                      screenshot_path: Optional[str] = None,
+                      block_assets: bool = False, include_hidden: bool = False,
+                      settle_time: int = 0) -> Dict[str, Any]:
         """
         Extract complete page data.
 
         Args:
             url: Target URL
-            wait_time: Wait time after page load (ms)
+            wait_time: Max wait for network idle after page load (ms)
             max_depth: Maximum DOM traversal depth
             full_screenshot: Whether to capture full page screenshot
+            include_xpath: Whether to add an xpath to every DOM node
+            screenshot_path: Write the screenshot to this file and return its
+                path under 'screenshot' instead of the PNG bytes
+            block_assets: Abort image, media, and font requests. Pages load
+                much faster, but images render empty in the screenshot and
+                unsized ones collapse in the layout
+            include_hidden: Also record the descendants of display:none
+                elements in dom_tree; assets and transitions always include them
+            settle_time: Fixed wait after the network-idle wait (ms), for
+                content rendered after the network goes idle
 
         Returns:
             Dict containing all extracted data
         """
-        start_time = datetime.now()
-
-        page = await self._browser.new_page(
+        context = await self._pool.acquire(
             viewport={'width': self.viewport_width, 'height': self.viewport_height}
         )
+        try:
+            return await self._extract_on_context(
+                context, url, wait_time, max_depth, full_screenshot, include_xpath,
+                screenshot_path, block_assets, include_hidden, settle_time
+            )
+        finally:
+            await context.close()
+
+    async def extract_many(self, urls: List[str], max_concurrency: int = 5,
+                           screenshot_paths: Optional[List[str]] = None,
+                           **options) -> List[Dict[str, Any]]:
+        """
+        Extract several pages concurrently, each in its own context.
+
+        Args:
+            urls: Target URLs
+            max_concurrency: Maximum pages extracted at the same time
+            screenshot_paths: Per-URL screenshot files, see extract(); must
+                match urls in length
+            **options: Passed through to extract()
+
+        Returns:
+            One result dict per URL, in input order
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        if screenshot_paths is None:
+            paths: List[Optional[str]] = [None] * len(urls)
+        elif len(screenshot_paths) != len(urls):
+            raise ValueError(
+                f"screenshot_paths has {len(screenshot_paths)} entries for {len(urls)} urls"
+            )
+        else:
+            paths = list(screenshot_paths)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def extract_one(url: str, screenshot_path: Optional[str]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.extract(url, screenshot_path=screenshot_path, **options)
+
+        results = await asyncio.gather(
+            *(extract_one(url, path) for url, path in zip(urls, paths)), return_exceptions=True
+        )
+
+        # extract() reports page failures itself; this catches context errors
+        # and cancellation (a BaseException, not an Exception)
+        return [
+            {'success': False, 'url': url, 'error': str(result) or type(result).__name__}
+            if isinstance(result, BaseException) else result
+            for url, result in zip(urls, results)
+        ]
+
+    async def _extract_on_context(self, context, url: str, wait_time: int, max_depth: int,
+                                  full_screenshot: bool, include_xpath: bool,
+                                  screenshot_path: Optional[str],
+                                  block_assets: bool = False,
+                                  include_hidden: bool = False,
+                                  settle_time: int = 0) -> Dict[str, Any]:
+        """Load url in a new page of context and extract everything from it."""
+        start_time = datetime.now()
 
         try:
+            page = await context.new_page()
+            if block_assets:
+                await page.route('**/*', self._block_asset_request)
             logger.info(f"Loading page: {url}")
             await page.goto(url, wait_until='load', timeout=60000)
-            await asyncio.sleep(wait_time / 1000)
+
+            # Wait up to wait_time for network idle (timeout=0 would mean forever)
+            if wait_time > 0:
+                try:
+                    await page.wait_for_load_state('networkidle', timeout=wait_time)
+                except Exception:
+                    pass
+
+            # Fixed settle time for content rendered after the network goes idle
+            if settle_time > 0:
+                await asyncio.sleep(settle_time / 1000)
 
             # Scroll to load lazy content
             await self._scroll_page(page)
@@ -108,30 +285,21 @@ class PageExtractor:
             logger.info("Extracting page data...")
 
             results = await asyncio.gather(
-                self._extract_metadata(page, url, load_time_ms),
-                self._extract_dom_tree(page, max_depth),
-                self._extract_assets(page),
-                self._take_screenshot(page, full_page=full_screenshot),
-                self._get_raw_html(page),
-                self._extract_css_data(page),
-                return_exceptions=True
+                self._with_timeout(
+                    self._extract_all_in_page(page, url, load_time_ms, max_depth, include_xpath, include_hidden),
+                    'page data'
+                ),
+                self._with_timeout(
+                    self._take_screenshot(page, full_page=full_screenshot, out_path=screenshot_path), 'screenshot'
+                ),
+                self._with_timeout(self._get_raw_html(page), 'raw HTML')
             )
 
             # Parse results
-            metadata = results[0] if not isinstance(results[0], Exception) else None
-            dom_tree = results[1] if not isinstance(results[1], Exception) else None
-            assets = results[2] if not isinstance(results[2], Exception) else None
-            screenshot = results[3] if not isinstance(results[3], Exception) else None
-            raw_html = results[4] if not isinstance(results[4], Exception) else None
-            css_data = results[5] if not isinstance(results[5], Exception) else None
-
-            # Compute style summary from DOM tree
-            style_summary = self._compute_style_summary(dom_tree) if dom_tree else None
-
-            # Log any errors
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    logger.error(f"Extraction task {i} failed: {result}")
+            metadata, dom_tree, style_summary, assets, css_data = \
+                results[0] if not isinstance(results[0], Exception) else (None, None, None, None, None)
+            screenshot = results[1] if not isinstance(results[1], Exception) else None
+            raw_html = results[2] if not isinstance(results[2], Exception) else None
 
             return {
                 'success': True,
@@ -153,37 +321,70 @@ class PageExtractor:
                 'url': url,
                 'error': str(e)
             }
-        finally:
-            await page.close()
 
-    async def _scroll_page(self, page, max_scrolls: int = 50, scroll_delay: float = 0.3):
-        """Scroll page to trigger lazy loading."""
+    async def _with_timeout(self, coro, name: str):
+        """Await a subtask for at most SUBTASK_TIMEOUT; returns its exception instead of raising."""
         try:
-            dimensions = await page.evaluate('''() => ({
-                viewportHeight: window.innerHeight,
-                scrollHeight: document.body.scrollHeight
-            })''')
-
-            viewport_height = dimensions['viewportHeight']
-            current_position = 0
-            scroll_count = 0
-            last_height = dimensions['scrollHeight']
-
-            while scroll_count < max_scrolls:
-                current_position += viewport_height
-                await page.evaluate(f'window.scrollTo(0, {current_position})')
-                await asyncio.sleep(scroll_delay)
-
-                new_height = await page.evaluate('document.body.scrollHeight')
-                scroll_count += 1
+            return await asyncio.wait_for(coro, self.SUBTASK_TIMEOUT)
+        except asyncio.TimeoutError as e:
+            logger.error(f"Extraction task '{name}' timed out after {self.SUBTASK_TIMEOUT}s")
+            return e
+        except Exception as e:
+            logger.error(f"Extraction task '{name}' failed: {e}")
+            return e
+
+    async def _block_asset_request(self, route):
+        """Route handler that aborts requests for heavy asset types."""
+        if route.request.resource_type in self.BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _scroll_page(self, page, max_scrolls: int = 50, scroll_delay: float = 0.3,
+                           quiet_period: float = 0.5):
+        """
+        Scroll page to trigger lazy loading.
+        At the bottom, waits for layout to stay unchanged for quiet_period.
+        """
+        try:
+            await page.evaluate('''async ({ maxScrolls, scrollDelay, quietPeriod }) => {
+                const sleep = ms => new Promise(r => setTimeout(r, ms));
 
-                if current_position >= new_height:
-                    if new_height <= last_height:
-                        break
-                    last_height = new_height
+                let lastChange = performance.now();
+                const observer = new ResizeObserver(() => { lastChange = performance.now(); });
+                observer.observe(document.body);
 
-            # Return to top
-            await page.evaluate('window.scrollTo(0, 0)')
+                try {
+                    let position = 0;
+                    for (let i = 0; i < maxScrolls; i++) {
+                        position += window.innerHeight;
+                        window.scrollTo(0, position);
+                        await sleep(scrollDelay);
+
+                        const height = document.body.scrollHeight;
+                        if (position < height) continue;
+
+                        // At the bottom: wait for layout to settle, then stop
+                        // unless the page grew
+                        const reachedAt = performance.now();
+                        const deadline = reachedAt + quietPeriod * 4;
+                        let quietFor;
+                        while ((quietFor = performance.now() - Math.max(lastChange, reachedAt)) < quietPeriod
+                               && performance.now() < deadline) {
+                            await sleep(quietPeriod - quietFor);
+                        }
+                        if (document.body.scrollHeight <= height) break;
+                    }
+                } finally {
+                    observer.disconnect();
+                    // Return to top
+                    window.scrollTo(0, 0);
+                }
+            }''', {
+                'maxScrolls': max_scrolls,
+                'scrollDelay': scroll_delay * 1000,
+                'quietPeriod': quiet_period * 1000
+            })
             await asyncio.sleep(0.5)
 
         except Exception as e:
@@ -193,76 +394,39 @@ class PageExtractor:
             except:
                 pass
 
-    async def _extract_metadata(self, page, url: str, load_time_ms: int) -> Dict:
-        """Extract page metadata."""
-        page_info = await page.evaluate('''() => ({
-            title: document.title,
-            viewportWidth: window.innerWidth,
-            viewportHeight: window.innerHeight,
-            pageWidth: document.documentElement.scrollWidth,
-            pageHeight: document.documentElement.scrollHeight,
-            totalElements: document.querySelectorAll('*').length
-        })''')
-
-        max_depth = await page.evaluate('''() => {
-            function getDepth(element, currentDepth) {
-                if (!element.children || element.children.length === 0) return currentDepth;
-                let maxChildDepth = currentDepth;
-                for (const child of element.children) {
-                    const childDepth = getDepth(child, currentDepth + 1);
-                    if (childDepth > maxChildDepth) maxChildDepth = childDepth;
-                }
-                return maxChildDepth;
-            }
-            return getDepth(document.body, 1);
-        }''')
+    async def _extract_all_in_page(self, page, url: str, load_time_ms: int, max_depth: int,
+                                   include_xpath: bool = False, include_hidden: bool = False
+                                   ) -> Tuple[Dict, Optional[Dict], Optional[Dict], Dict, Dict]:
+        """
+        Extract metadata, the DOM tree, assets, and CSS data in one evaluate.
 
-        return {
-            'url': url,
-            'title': page_info['title'],
-            'viewport_width': page_info['viewportWidth'],
-            'viewport_height': page_info['viewportHeight'],
-            'page_width': page_info['pageWidth'],
-            'page_height': page_info['pageHeight'],
-            'total_elements': page_info['totalElements'],
-            'max_depth': max_depth,
-            'load_time_ms': load_time_ms
-        }
+        Returns:
+            (metadata, dom_tree, style_summary, assets, css_data)
+        """
+        data = await page.evaluate('''(params) => {
+            const { maxDepth, skipHidden, styleProps: STYLE_PROPS } = params;
 
-    async def _extract_dom_tree(self, page, max_depth: int) -> Dict:
-        """Extract complete DOM tree with styles."""
-        dom_data = await page.evaluate('''(params) => {
-            const { maxDepth } = params;
-
-            const STYLE_PROPS = [
-                'display', 'position', 'float',
-                'flexDirection', 'flexWrap', 'justifyContent', 'alignItems', 'alignContent', 'gap',
-                'gridTemplateColumns', 'gridTemplateRows', 'gridColumn', 'gridRow',
-                'width', 'height', 'minWidth', 'minHeight', 'maxWidth', 'maxHeight',
-                'margin', 'marginTop', 'marginRight', 'marginBottom', 'marginLeft',
-                'padding', 'paddingTop', 'paddingRight', 'paddingBottom', 'paddingLeft',
-                'top', 'right', 'bottom', 'left', 'zIndex',
-                'backgroundColor', 'backgroundImage', 'color', 'border', 'borderRadius',
-                'boxShadow', 'opacity', 'overflow', 'visibility',
-                'fontFamily', 'fontSize', 'fontWeight', 'lineHeight', 'textAlign',
-                'transform'
-            ];
-
-            const INTERACTIVE_TAGS = ['A', 'BUTTON', 'INPUT', 'SELECT', 'TEXTAREA'];
-            const IMPORTANT_ATTRS = ['href', 'src', 'alt', 'title', 'type', 'name', 'placeholder', 'role'];
-
-            function camelToSnake(str) {
-                return str.replace(/([a-z])([A-Z])/g, '$1_$2').toLowerCase();
-            }
+            const INTERACTIVE_TAGS = new Set(['A', 'BUTTON', 'INPUT', 'SELECT', 'TEXTAREA']);
+            const IMPORTANT_ATTRS = new Set(['href', 'src', 'alt', 'title', 'type', 'name', 'placeholder', 'role']);
+            const URL_RE = /url\\(["']?([^"')]+)["']?\\)/;
 
-            function isVisible(el, styles) {
+            function isVisible(styles, rect) {
                 if (styles.display === 'none' || styles.visibility === 'hidden' || styles.opacity === '0') {
                     return false;
                 }
-                const rect = el.getBoundingClientRect();
                 return rect.width > 0 && rect.height > 0;
             }
 
+            function toBase64(typedArray) {
+                const bytes = new Uint8Array(typedArray.buffer);
+                let binary = '';
+                // Chunked to stay under the argument count limit
+                for (let i = 0; i < bytes.length; i += 0x8000) {
+                    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+                }
+                return btoa(binary);
+            }
+
             function getDirectText(el) {
                 let text = '';
                 for (const node of el.childNodes) {
@@ -273,158 +437,225 @@ class PageExtractor:
                 return text.trim().slice(0, 200);
             }
 
-            function extractElement(el, depth, path) {
-                if (depth > maxDepth) return null;
+            // Distinct strings, referenced by index; index 0 is null
+            const strings = [null];
+            const stringIndex = new Map();
+            function intern(str) {
+                let i = stringIndex.get(str);
+                if (i === undefined) {
+                    i = strings.length;
+                    strings.push(str);
+                    stringIndex.set(str, i);
+                }
+                return i;
+            }
+
+            // One column per style property in node order; defaults are null
+            const styleColumns = STYLE_PROPS.map(() => []);
 
-                const styles = window.getComputedStyle(el);
-                const visible = isVisible(el, styles);
-                const rect = el.getBoundingClientRect();
+            // x, y, width, height of every node, flattened
+            const rects = [];
 
-                const styleObj = {};
-                for (const prop of STYLE_PROPS) {
-                    const value = styles[prop];
-                    if (value && value !== 'none' && value !== 'normal' && value !== 'auto' && value !== '0px') {
-                        styleObj[camelToSnake(prop)] = value;
-                    }
+            function extractElement(el, styles, parent) {
+                const rect = el.getBoundingClientRect();
+                const visible = isVisible(styles, rect);
+                rects.push(rect.x, rect.y, rect.width, rect.height);
+
+                for (let p = 0; p < STYLE_PROPS.length; p++) {
+                    const value = styles[STYLE_PROPS[p]];
+                    styleColumns[p].push(
+                        value && value !== 'none' && value !== 'normal' && value !== 'auto' && value !== '0px'
+                            ? intern(value) : 0
+                    );
                 }
 
                 const attrs = {};
-                for (const attrName of IMPORTANT_ATTRS) {
-                    if (el.hasAttribute(attrName)) {
-                        attrs[attrName] = el.getAttribute(attrName);
-                    }
-                }
-
-                const children = [];
-                let childIndex = 0;
-                for (const child of el.children) {
-                    const childInfo = extractElement(child, depth + 1, path + '/' + child.tagName.toLowerCase() + '[' + childIndex + ']');
-                    if (childInfo) children.push(childInfo);
-                    childIndex++;
+                for (const { name, value } of el.attributes) {
+                    if (IMPORTANT_ATTRS.has(name)) attrs[name] = value;
                 }
 
                 return {
-                    tag: el.tagName.toLowerCase(),
+                    tag: intern(el.tagName.toLowerCase()),
                     id: el.id || null,
-                    classes: el.className && typeof el.className === 'string' ? el.className.trim().split(/\\s+/).filter(c => c) : [],
-                    rect: {
-                        x: rect.x, y: rect.y, width: rect.width, height: rect.height,
-                        top: rect.top, right: rect.right, bottom: rect.bottom, left: rect.left
-                    },
-                    styles: styleObj,
+                    classes: el.className && typeof el.className === 'string' ? el.className.trim().split(/\\s+/).filter(c => c).map(intern) : [],
+                    rect: null,  // rebuilt from rects in Python
                     text_content: getDirectText(el),
-                    inner_html_length: el.innerHTML.length,
+                    inner_html_length: 0,  // filled in once the walk is done
                     attributes: attrs,
                     is_visible: visible,
-                    is_interactive: INTERACTIVE_TAGS.includes(el.tagName),
-                    children: children,
+                    is_interactive: INTERACTIVE_TAGS.has(el.tagName),
                     children_count: el.children.length,
-                    xpath: path
+                    parent: parent
                 };
             }
 
-            return extractElement(document.body, 1, '/body');
-        }''', {'maxDepth': max_depth})
-
-        return dom_data
-
-    async def _extract_assets(self, page) -> Dict:
-        """Extract all page assets (images, scripts, stylesheets, fonts)."""
-        assets_data = await page.evaluate('''() => {
-            const result = { images: [], scripts: [], stylesheets: [], fonts: [] };
+            // First entry per URL; totals count every reference
+            const assets = {
+                images: [], scripts: [], stylesheets: [], fonts: [],
+                total_images: 0, total_scripts: 0, total_stylesheets: 0, total_fonts: 0
+            };
+            const seenAssets = {
+                images: new Set(), scripts: new Set(), stylesheets: new Set(), fonts: new Set()
+            };
+            function addAsset(kind, item) {
+                assets['total_' + kind]++;
+                if (seenAssets[kind].has(item.url)) return;
+                seenAssets[kind].add(item.url);
+                assets[kind].push(item);
+            }
+            const backgrounds = [];
+            const css = { variables: [], animations: [], transitions: [], media_queries: {} };
+            const seenTransitions = new Set();
+
+            // Flat pre-order list of recorded body elements
+            const root = document.body;
+            const nodes = [];
+
+            // Per body element, recorded or not: parent, depth, whether its
+            // descendants are skipped, node index (-1 if none), and lengths
+            const bodyIndex = new Map([[root, 0]]);
+            const bodyParent = [-1];
+            const bodyDepth = [1];
+            const bodyPruned = [];
+            const bodyNode = [];
+            const tagLength = [];
+            const innerLength = [];
+            let pageDepth = 1;
+
+            // Elements serialized without a closing tag
+            const VOID_TAGS = new Set(['AREA', 'BASE', 'BASEFONT', 'BGSOUND', 'BR', 'COL', 'EMBED',
+                                       'FRAME', 'HR', 'IMG', 'INPUT', 'KEYGEN', 'LINK', 'META',
+                                       'PARAM', 'SOURCE', 'TRACK', 'WBR']);
+
+            const allElements = document.querySelectorAll('*');
+            for (const el of allElements) {
+                let b = -1;  // stays -1 outside body
+                if (el === root) {
+                    b = 0;
+                } else {
+                    const parentBody = bodyIndex.get(el.parentNode);
+                    if (parentBody !== undefined) {
+                        b = bodyParent.length;
+                        bodyIndex.set(el, b);
+                        bodyParent.push(parentBody);
+                        bodyDepth.push(bodyDepth[parentBody] + 1);
+                        if (bodyDepth[b] > pageDepth) pageDepth = bodyDepth[b];
+                    }
+                }
 
-            // Images (including background images)
-            document.querySelectorAll('img').forEach(img => {
-                if (img.src) result.images.push({ url: img.src, type: 'image', alt: img.alt || '' });
-            });
+                const styles = window.getComputedStyle(el);
 
-            document.querySelectorAll('*').forEach(el => {
-                const bg = window.getComputedStyle(el).backgroundImage;
+                // Background images
+                const bg = styles.backgroundImage;
                 if (bg && bg !== 'none' && bg.includes('url(')) {
-                    const match = bg.match(/url\\(["']?([^"')]+)["']?\\)/);
+                    const match = bg.match(URL_RE);
                     if (match && match[1]) {
-                        result.images.push({ url: match[1], type: 'background-image' });
+                        backgrounds.push(match[1]);
                     }
                 }
+
+                // Transitions
+                const transitionProp = styles.transitionProperty;
+                const transitionDur = styles.transitionDuration;
+                if (transitionProp && transitionProp !== 'none' && transitionDur !== '0s') {
+                    const selector = el.id ? `#${el.id}` :
+                        (el.className && typeof el.className === 'string' ?
+                            el.tagName.toLowerCase() + '.' + el.className.split(' ')[0] :
+                            el.tagName.toLowerCase());
+
+                    const key = selector + '_' + transitionProp;
+                    if (!seenTransitions.has(key)) {
+                        seenTransitions.add(key);
+                        css.transitions.push({
+                            selector: selector,
+                            property: transitionProp,
+                            duration: transitionDur,
+                            timing_function: styles.transitionTimingFunction
+                        });
+                    }
+                }
+
+                // DOM tree
+                if (b < 0) continue;
+                // Not recorded under a display:none element (still scanned above)
+                const hidden = b > 0 && bodyPruned[bodyParent[b]];
+                bodyPruned.push(skipHidden && (hidden || styles.display === 'none'));
+
+                // Serialized length of tags, attributes, text, and comments
+                const tagName = el.tagName;
+                let tagLen = tagName.length + 2 + (VOID_TAGS.has(tagName) ? 0 : tagName.length + 3);
+                for (const attr of el.attributes) tagLen += attr.name.length + attr.value.length + 4;
+                let textLen = 0;
+                for (const child of el.childNodes) {
+                    if (child.nodeType === Node.TEXT_NODE) textLen += child.data.length;
+                    else if (child.nodeType === Node.COMMENT_NODE) textLen += child.data.length + 7;
+                }
+                tagLength.push(tagLen);
+                innerLength.push(textLen);
+
+                if (hidden || bodyDepth[b] > maxDepth) {
+                    bodyNode.push(-1);
+                    continue;
+                }
+                const parent = el === root ? -1 : bodyNode[bodyParent[b]];
+                bodyNode.push(nodes.length);
+                nodes.push(extractElement(el, styles, parent));
+            }
+
+            // Fold each element's length into its parent; entity escaping and
+            // <template> contents (not child nodes) are not counted
+            for (let b = innerLength.length - 1; b > 0; b--) {
+                innerLength[bodyParent[b]] += tagLength[b] + innerLength[b];
+            }
+            for (let b = 0; b < bodyNode.length; b++) {
+                if (bodyNode[b] >= 0) nodes[bodyNode[b]].inner_html_length = innerLength[b];
+            }
+
+            const meta = {
+                title: document.title,
+                viewportWidth: window.innerWidth,
+                viewportHeight: window.innerHeight,
+                pageWidth: document.documentElement.scrollWidth,
+                pageHeight: document.documentElement.scrollHeight,
+                totalElements: allElements.length,
+                maxDepth: pageDepth
+            };
+
+            // Images (background images after <img> sources)
+            document.querySelectorAll('img').forEach(img => {
+                if (img.src) addAsset('images', { url: img.src, type: 'image', alt: img.alt || '' });
             });
+            for (const url of backgrounds) {
+                addAsset('images', { url: url, type: 'background-image' });
+            }
 
             // Scripts
             document.querySelectorAll('script[src]').forEach(script => {
-                result.scripts.push({ url: script.src, type: 'script' });
+                addAsset('scripts', { url: script.src, type: 'script' });
             });
 
             // Stylesheets
             document.querySelectorAll('link[rel="stylesheet"]').forEach(link => {
-                result.stylesheets.push({ url: link.href, type: 'stylesheet' });
+                addAsset('stylesheets', { url: link.href, type: 'stylesheet' });
             });
 
-            // Fonts
+            // Fonts, CSS variables from :root, @keyframes, and @media
             for (const sheet of document.styleSheets) {
                 try {
                     for (const rule of sheet.cssRules || []) {
                         if (rule instanceof CSSFontFaceRule) {
                             const src = rule.style.getPropertyValue('src');
-                            const urlMatch = src.match(/url\\(["']?([^"')]+)["']?\\)/);
+                            const urlMatch = src.match(URL_RE);
                             if (urlMatch && urlMatch[1]) {
-                                result.fonts.push({ url: urlMatch[1], type: 'font' });
+                                addAsset('fonts', { url: urlMatch[1], type: 'font' });
                             }
                         }
-                    }
-                } catch (e) {}
-            }
-
-            return result;
-        }''')
-
-        # Deduplicate
-        def dedupe(items):
-            seen = set()
-            result = []
-            for item in items:
-                if item['url'] not in seen:
-                    seen.add(item['url'])
-                    result.append(item)
-            return result
-
-        return {
-            'images': dedupe(assets_data['images']),
-            'scripts': dedupe(assets_data['scripts']),
-            'stylesheets': dedupe(assets_data['stylesheets']),
-            'fonts': dedupe(assets_data['fonts']),
-            'total_images': len(assets_data['images']),
-            'total_scripts': len(assets_data['scripts']),
-            'total_stylesheets': len(assets_data['stylesheets']),
-            'total_fonts': len(assets_data['fonts'])
-        }
-
-    async def _take_screenshot(self, page, full_page: bool = True) -> str:
-        """Take page screenshot and return base64 encoded."""
-        screenshot_bytes = await page.screenshot(type='png', full_page=full_page)
-        return base64.b64encode(screenshot_bytes).decode('utf-8')
 
-    async def _get_raw_html(self, page) -> str:
-        """Get complete page HTML."""
-        return await page.content()
-
-    async def _extract_css_data(self, page) -> Dict:
-        """Extract CSS variables, animations, and transitions."""
-        css_data = await page.evaluate('''() => {
-            const result = {
-                variables: [],
-                animations: [],
-                transitions: [],
-                media_queries: {}
-            };
-
-            // CSS Variables from :root
-            for (const sheet of document.styleSheets) {
-                try {
-                    for (const rule of sheet.cssRules || []) {
                         if (rule instanceof CSSStyleRule && rule.selectorText === ':root') {
                             for (let i = 0; i < rule.style.length; i++) {
                                 const prop = rule.style[i];
                                 if (prop.startsWith('--')) {
-                                    result.variables.push({
+                                    css.variables.push({
                                         name: prop,
                                         value: rule.style.getPropertyValue(prop).trim()
                                     });
@@ -432,7 +663,6 @@ class PageExtractor:
                             }
                         }
 
-                        // @keyframes
                         if (rule instanceof CSSKeyframesRule) {
                             const keyframes = [];
                             for (const kf of rule.cssRules) {
@@ -441,107 +671,228 @@ class PageExtractor:
                                     styles: kf.style.cssText
                                 });
                             }
-                            result.animations.push({ name: rule.name, keyframes: keyframes });
+                            css.animations.push({ name: rule.name, keyframes: keyframes });
                         }
 
-                        // @media
                         if (rule instanceof CSSMediaRule) {
-                            result.media_queries[rule.conditionText] = rule.cssText.slice(0, 500);
+                            css.media_queries[rule.conditionText] = rule.cssText.slice(0, 500);
                         }
                     }
                 } catch (e) {}
             }
 
-            // Transitions
-            const seen = new Set();
-            document.querySelectorAll('*').forEach(el => {
-                const styles = getComputedStyle(el);
-                const transitionProp = styles.transitionProperty;
-                const transitionDur = styles.transitionDuration;
+            return {
+                meta, nodes, strings, rects: toBase64(new Float64Array(rects)),
+                styleColumns, assets, css
+            };
+        }''', {'maxDepth': max_depth, 'skipHidden': not include_hidden, 'styleProps': self.STYLE_PROPS})
 
-                if (transitionProp && transitionProp !== 'none' && transitionDur !== '0s') {
-                    const selector = el.id ? `#${el.id}` :
-                        (el.className && typeof el.className === 'string' ?
-                            el.tagName.toLowerCase() + '.' + el.className.split(' ')[0] :
-                            el.tagName.toLowerCase());
+        meta = data['meta']
+        metadata = {
+            'url': url,
+            'title': meta['title'],
+            'viewport_width': meta['viewportWidth'],
+            'viewport_height': meta['viewportHeight'],
+            'page_width': meta['pageWidth'],
+            'page_height': meta['pageHeight'],
+            'total_elements': meta['totalElements'],
+            'max_depth': meta['maxDepth'],
+            'load_time_ms': load_time_ms
+        }
 
-                    const key = selector + '_' + transitionProp;
-                    if (!seen.has(key)) {
-                        seen.add(key);
-                        result.transitions.push({
-                            selector: selector,
-                            property: transitionProp,
-                            duration: transitionDur,
-                            timing_function: styles.transitionTimingFunction
-                        });
-                    }
-                }
-            });
+        strings = data['strings']
+        style_columns = {
+            key: [strings[i] for i in column]
+            for key, column in zip(self.STYLE_KEYS, data['styleColumns'])
+        }
+        rects = array('d', base64.b64decode(data['rects']))
+        if sys.byteorder == 'big':
+            # Typed arrays are little-endian on every platform browsers ship on
+            rects.byteswap()
+        dom_tree = self._build_dom_tree(data['nodes'], style_columns, strings, rects, include_xpath)
+        style_summary = self._compute_style_summary(style_columns) if dom_tree else None
+
+        return metadata, dom_tree, style_summary, data['assets'], data['css']
+
+    @staticmethod
+    def _build_dom_tree(nodes: List[Dict], style_columns: Dict[str, List],
+                        strings: List[Optional[str]], rects: array,
+                        include_xpath: bool = False) -> Optional[Dict]:
+        """Rebuild the nested DOM tree from the flat pre-order node list."""
+        if not nodes:
+            return None
+
+        style_keys = list(style_columns)
+        for i, (node, row) in enumerate(zip(nodes, zip(*style_columns.values()))):
+            x, y, width, height = rects[4 * i:4 * i + 4]
+            # getBoundingClientRect never has a negative width or height
+            node['rect'] = {
+                'x': x, 'y': y, 'width': width, 'height': height,
+                'top': y, 'right': x + width, 'bottom': y + height, 'left': x
+            }
+            node['tag'] = strings[node['tag']]
+            node['classes'] = [strings[i] for i in node['classes']]
+            node['styles'] = {key: value for key, value in zip(style_keys, row) if value is not None}
+            node['children'] = []
+
+        root = nodes[0]
+        del root['parent']
+        if include_xpath:
+            root['xpath'] = '/' + root['tag']
+
+        for node in nodes[1:]:
+            parent = nodes[node.pop('parent')]
+            if include_xpath:
+                node['xpath'] = f"{parent['xpath']}/{node['tag']}[{len(parent['children'])}]"
+            parent['children'].append(node)
+
+        return root
+
+    async def _take_screenshot(self, page, full_page: bool = True,
+                               out_path: Optional[str] = None) -> Union[bytes, str]:
+        """Take page screenshot; returns out_path if given, else the image bytes."""
+        options = {'type': self.screenshot_format, 'full_page': full_page}
+        if self.screenshot_format == 'jpeg':
+            options['quality'] = self.screenshot_quality
+
+        if out_path:
+            await page.screenshot(path=out_path, **options)
+            return out_path
+        return await page.screenshot(**options)
+
+    async def _get_raw_html(self, page) -> str:
+        """Get complete page HTML."""
+        return await page.content()
 
-            return result;
-        }''')
+    # (summary key, style key) pairs counted by _compute_style_summary
+    SUMMARY_KEYS = (
+        ('colors', 'color'),
+        ('background_colors', 'background_color'),
+        ('font_families', 'font_family'),
+        ('font_sizes', 'font_size'),
+        ('display_types', 'display'),
+        ('position_types', 'position'),
+    )
+
+    def _compute_style_summary(self, style_columns: Dict[str, List]) -> Dict:
+        """Compute style statistics from the per-property style columns."""
+        summary = {}
+        for key, style_key in self.SUMMARY_KEYS:
+            # Nulls (defaults) are skipped
+            counts = Counter(filter(None, style_columns.get(style_key, ())))
+            summary[key] = dict(counts.most_common(20))
+        return summary
 
-        return css_data
 
-    def _compute_style_summary(self, dom_tree: Dict) -> Dict:
-        """Compute style statistics from DOM tree."""
-        summary = {
-            'colors': {},
-            'background_colors': {},
-            'font_families': {},
-            'font_sizes': {},
-            'display_types': {},
-            'position_types': {}
-        }
+def save_result(result: Dict[str, Any], output_path: str) -> bool:
+    """
+    Write one extraction result to disk and log a summary; returns success.
+    The screenshot and gzipped raw HTML are saved beside the JSON.
+    """
+    screenshot = result.get('screenshot')
+    if isinstance(screenshot, bytes):
+        screenshot_format = 'jpeg' if screenshot.startswith(b'\xff\xd8') else 'png'
+        screenshot_path = screenshot_output_path(output_path, screenshot_format)
+        with open(screenshot_path, 'wb') as f:
+            f.write(screenshot)
+        screenshot = screenshot_path
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    if screenshot:
+        result = {**result, 'screenshot': os.path.relpath(os.path.abspath(screenshot), output_dir)}
+
+    raw_html = result.get('raw_html')
+    if isinstance(raw_html, str):
+        html_path = html_output_path(output_path)
+        with gzip.open(html_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(raw_html)
+        result = {**result, 'raw_html': {
+            'path': os.path.relpath(os.path.abspath(html_path), output_dir),
+            'size': len(raw_html)
+        }}
+
+    write_json(output_path, result)
 
-        def traverse(element):
-            if not element:
-                return
-
-            styles = element.get('styles', {})
-
-            if styles.get('color'):
-                summary['colors'][styles['color']] = summary['colors'].get(styles['color'], 0) + 1
-            if styles.get('background_color'):
-                summary['background_colors'][styles['background_color']] = \
-                    summary['background_colors'].get(styles['background_color'], 0) + 1
-            if styles.get('font_family'):
-                summary['font_families'][styles['font_family']] = \
-                    summary['font_families'].get(styles['font_family'], 0) + 1
-            if styles.get('font_size'):
-                summary['font_sizes'][styles['font_size']] = \
-                    summary['font_sizes'].get(styles['font_size'], 0) + 1
-            if styles.get('display'):
-                summary['display_types'][styles['display']] = \
-                    summary['display_types'].get(styles['display'], 0) + 1
-            if styles.get('position'):
-                summary['position_types'][styles['position']] = \
-                    summary['position_types'].get(styles['position'], 0) + 1
-
-            for child in element.get('children', []):
-                traverse(child)
-
-        traverse(dom_tree)
-
-        # Sort and limit to top 20
-        for key in summary:
-            sorted_items = sorted(summary[key].items(), key=lambda x: x[1], reverse=True)[:20]
-            summary[key] = dict(sorted_items)
+    if result['success']:
+        logger.info(f"Extraction complete! Saved to {output_path}")
+        if result.get('metadata'):
+            logger.info(f"  - Page title: {result['metadata'].get('title', 'N/A')}")
+            logger.info(f"  - Page size: {result['metadata'].get('page_width')}x{result['metadata'].get('page_height')}")
+            logger.info(f"  - Total elements: {result['metadata'].get('total_elements')}")
+        if result.get('assets'):
+            logger.info(f"  - Images: {result['assets'].get('total_images', 0)}")
+        return True
 
-        return summary
+    logger.error(f"Extraction failed for {result.get('url')}: {result.get('error')}")
+    return False
+
+
+def screenshot_output_path(output: str, screenshot_format: str = 'jpeg') -> str:
+    """page_data.json -> page_data.jpg (or page_data.png)"""
+    ext = '.jpg' if screenshot_format == 'jpeg' else '.png'
+    return os.path.splitext(output)[0] + ext
+
+
+def html_output_path(output: str) -> str:
+    """page_data.json -> page_data.html.gz"""
+    return os.path.splitext(output)[0] + '.html.gz'
+
+
+def non_negative_int(value: str) -> int:
+    """argparse type for integers that must be >= 0."""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be >= 0, got {number}")
+    return number
+
+
+def positive_int(value: str) -> int:
+    """argparse type for integers that must be >= 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {number}")
+    return number
+
+
+def batch_output_path(output: str, index: int) -> str:
+    """page_data.json -> page_data_1.json, page_data_2.json, ..."""
+    stem, ext = os.path.splitext(output)
+    return f"{stem}_{index}{ext or '.json'}"
 
 
 async def main():
     parser = argparse.ArgumentParser(description='Extract webpage data for cloning')
-    parser.add_argument('url', help='URL to extract')
+    parser.add_argument('url', nargs='?', help='URL to extract')
+    parser.add_argument('--urls-file', help='File with one URL per line to extract in a batch')
+    parser.add_argument('--concurrency', type=positive_int, default=5, help='Pages extracted at once with --urls-file')
     parser.add_argument('--output', '-o', default='page_data.json', help='Output file path')
     parser.add_argument('--viewport', default='1920x1080', help='Viewport size WxH')
-    parser.add_argument('--wait', type=int, default=3000, help='Wait time after load (ms)')
+    parser.add_argument('--wait', type=non_negative_int, default=3000, help='Max wait for network idle after load (ms); 0 skips it')
+    parser.add_argument('--settle', type=non_negative_int, default=0,
+                        help='Fixed extra wait after network idle (ms), for late-rendering SPAs')
     parser.add_argument('--full-screenshot', action='store_true', help='Capture full page screenshot')
+    parser.add_argument('--screenshot-format', choices=['jpeg', 'png'], default='jpeg',
+                        help='Screenshot image format; png for pixel-exact diffs')
+    parser.add_argument('--screenshot-quality', type=int, default=85, help='JPEG screenshot quality (0-100)')
     parser.add_argument('--max-depth', type=int, default=20, help='Maximum DOM traversal depth')
+    parser.add_argument('--xpath', action='store_true', help='Include an xpath on every DOM node')
+    parser.add_argument('--include-hidden', action='store_true',
+                        help='Also put elements inside display:none subtrees in the DOM tree '
+                             '(their assets and transitions are always collected)')
+    parser.add_argument('--block-assets', action='store_true',
+                        help='Skip downloading images, media, and fonts (URLs are still recorded)')
 
     args = parser.parse_args()
 
+    if args.urls_file:
+        with open(args.urls_file, encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+        if args.url:
+            urls.insert(0, args.url)
+    elif args.url:
+        urls = [args.url]
+    else:
+        parser.error('a URL or --urls-file is required')
+
     # Parse viewport
     try:
         width, height = map(int, args.viewport.split('x'))
@@ -549,31 +900,43 @@ async def main():
         width, height = 1920, 1080
         logger.warning(f"Invalid viewport format, using default {width}x{height}")
 
-    logger.info(f"Starting extraction: {args.url}")
+    logger.info(f"Starting extraction: {', '.join(urls)}")
     logger.info(f"Viewport: {width}x{height}, Wait: {args.wait}ms")
 
-    async with PageExtractor(viewport_width=width, viewport_height=height) as extractor:
-        result = await extractor.extract(
-            url=args.url,
-            wait_time=args.wait,
-            max_depth=args.max_depth,
-            full_screenshot=args.full_screenshot
-        )
+    options = {
+        'wait_time': args.wait,
+        'max_depth': args.max_depth,
+        'full_screenshot': args.full_screenshot,
+        'include_xpath': args.xpath,
+        'block_assets': args.block_assets,
+        'include_hidden': args.include_hidden,
+        'settle_time': args.settle
+    }
+
+    # A batch writes one numbered file per URL
+    if args.urls_file:
+        outputs = [batch_output_path(args.output, i) for i in range(1, len(urls) + 1)]
+    else:
+        outputs = [args.output]
 
-    # Save result
-    with open(args.output, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    # Screenshots go straight to disk beside each output file
+    screenshot_paths = [screenshot_output_path(output, args.screenshot_format) for output in outputs]
 
-    if result['success']:
-        logger.info(f"Extraction complete! Saved to {args.output}")
-        if result.get('metadata'):
-            logger.info(f"  - Page title: {result['metadata'].get('title', 'N/A')}")
-            logger.info(f"  - Page size: {result['metadata'].get('page_width')}x{result['metadata'].get('page_height')}")
-            logger.info(f"  - Total elements: {result['metadata'].get('total_elements')}")
-        if result.get('assets'):
-            logger.info(f"  - Images: {result['assets'].get('total_images', 0)}")
-    else:
-        logger.error(f"Extraction failed: {result.get('error')}")
+    async with PageExtractor(viewport_width=width, viewport_height=height,
+                             screenshot_format=args.screenshot_format,
+                             screenshot_quality=args.screenshot_quality) as extractor:
+        if args.urls_file:
+            results = await extractor.extract_many(
+                urls, max_concurrency=args.concurrency, screenshot_paths=screenshot_paths, **options
+            )
+        else:
+            results = [await extractor.extract(url=urls[0], screenshot_path=screenshot_paths[0], **options)]
+
+    ok = True
+    for result, output_path in zip(results, outputs):
+        ok = save_result(result, output_path) and ok
+
+    if not ok:
         sys.exit(1)
 
 